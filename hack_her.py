@@ -1,22 +1,602 @@
 import streamlit as st
-import pandas as pd
 import difflib
-from geopy.distance import geodesic
+import atexit
 from datetime import datetime
 import streamlit.components.v1 as components
 import calendar
+import csv
+import hashlib
+import io
+import logging
+import mmap
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+
+# pandas, geopy, PIL and pyarrow are imported lazily in the code paths that
+# need them so the login page renders without loading them.
 
 # ────────────────────────────────────────────────
 # CONFIGURATION & SHARED CATALOG
 # ────────────────────────────────────────────────
 st.set_page_config(page_title="LowKey Deals", layout="wide", page_icon="✨")
 
+log = logging.getLogger("lowkey_deals")
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+    log.setLevel(logging.INFO)
+
+SNAPSHOT_PATH = Path(os.environ.get("LOWKEY_SNAPSHOT", Path(__file__).parent / "catalog_snapshot.pkl"))
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DEBOUNCE_S = 5.0
+SNAPSHOT_TIMER_NAME = "catalog-snapshot"
+
+def process_started_at():
+    # Startup is measured from process start, so it includes interpreter and
+    # server boot, not just the first script run
+    try:
+        with open("/proc/self/stat") as f:
+            # starttime (field 22) in clock ticks since boot; fields are
+            # counted after the parenthesised command name
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except ImportError:
+        log.info("Process start time unavailable; measuring startup from the first script run")
+        return time.time()
+
+@st.cache_resource
+def get_startup_metrics():
+    return {"started_at": process_started_at(), "snapshot_load_s": None, "first_paint_s": None, "ready_s": None}
+
+STARTUP_METRICS = get_startup_metrics()
+
+@st.cache_resource
+def load_catalog_snapshot():
+    started = time.perf_counter()
+    snapshot = {}
+    try:
+        # Unpickle from a read-only mapping rather than read() into a bytes
+        # buffer first; every object is still built, this only skips that copy
+        with open(SNAPSHOT_PATH, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            snapshot = pickle.loads(mm)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError) as e:
+        log.warning("Ignoring unreadable catalog snapshot %s: %s", SNAPSHOT_PATH, e)
+
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        snapshot = {}
+
+    STARTUP_METRICS["snapshot_load_s"] = time.perf_counter() - started
+    log.info("Loaded catalog snapshot with %d products in %.1f ms",
+             len(snapshot.get("catalog", {})), STARTUP_METRICS["snapshot_load_s"] * 1000)
+    return {
+        "catalog": snapshot.get("catalog", {}),
+        "product_images": snapshot.get("product_images", {}),
+        "product_ids": snapshot.get("product_ids", {}),
+        "product_keys": snapshot.get("product_keys", {}),
+        "merge_queue": snapshot.get("merge_queue", []),
+        "exports": snapshot.get("exports", {}),
+        "deleted_offers": snapshot.get("deleted_offers", []),
+        "lock": threading.Lock(),
+        "export_lock": threading.Lock(),
+        "timer_lock": threading.Lock(),
+        "timer": None
+    }
+
+SNAPSHOT = load_catalog_snapshot()
+
 @st.cache_resource
 def get_shared_catalog():
-    return {}
+    return SNAPSHOT["catalog"]
 
 GLOBAL_CATALOG = get_shared_catalog()
 
+def save_catalog_snapshot():
+    # Runs on the debounce timer thread or at exit, never in a script run
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "catalog": GLOBAL_CATALOG,
+        "product_images": PRODUCT_IMAGES,
+        "product_ids": PRODUCT_IDS,
+        "product_keys": PRODUCT_KEYS,
+        "merge_queue": MERGE_QUEUE,
+        "exports": EXPORT_LOG,
+        "deleted_offers": DELETED_OFFERS
+    }
+    with SNAPSHOT["lock"]:
+        try:
+            data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        except RuntimeError as e:
+            # Another session mutated the catalog mid-dump; try again shortly
+            log.info("Catalog changed during snapshot, retrying: %s", e)
+            schedule_catalog_snapshot()
+            return False
+        try:
+            tmp_path = SNAPSHOT_PATH.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, SNAPSHOT_PATH)
+        except OSError as e:
+            log.warning("Could not write catalog snapshot %s: %s", SNAPSHOT_PATH, e)
+            return False
+    return True
+
+def schedule_catalog_snapshot():
+    # Coalesce a burst of edits into one background write shortly after the first
+    with SNAPSHOT["timer_lock"]:
+        if SNAPSHOT["timer"] is not None:
+            return
+        timer = threading.Timer(SNAPSHOT_DEBOUNCE_S, flush_catalog_snapshot)
+        timer.name = SNAPSHOT_TIMER_NAME
+        timer.daemon = True
+        SNAPSHOT["timer"] = timer
+    timer.start()
+
+def flush_catalog_snapshot():
+    with SNAPSHOT["timer_lock"]:
+        timer, SNAPSHOT["timer"] = SNAPSHOT["timer"], None
+    if timer is not None:
+        timer.cancel()
+        save_catalog_snapshot()
+
+@st.cache_resource
+def register_snapshot_flush():
+    atexit.register(flush_catalog_snapshot)
+
+register_snapshot_flush()
+
+def distance_km(a, b):
+    from geopy.distance import geodesic
+    return geodesic(a, b).km
+
+# ────────────────────────────────────────────────
+# PRODUCT IMAGES (one per product, resized once, LRU-cached)
+# ────────────────────────────────────────────────
+IMAGE_DIR = Path(__file__).parent / "product_images"
+IMAGE_SIZES = {"card": (320, 180), "detail": (640, 360)}
+# The detail rendition is the stored copy of an upload; cards are derived from it
+STORED_SIZE = "detail"
+IMAGE_CACHE_MAX = 64
+IMAGE_STORE_MAX_BYTES = 256 * 2**20
+IMAGE_CARD_DISK_MAX_BYTES = 32 * 2**20
+
+class ImageQuotaError(Exception):
+    pass
+
+@st.cache_resource
+def get_image_store():
+    # product name -> ETag (content hash of the original upload)
+    return {"products": SNAPSHOT["product_images"], "lru": OrderedDict(), "lock": threading.Lock()}
+
+IMAGE_STORE = get_image_store()
+PRODUCT_IMAGES = IMAGE_STORE["products"]
+
+def image_path(etag, size_name):
+    return IMAGE_DIR / f"{etag}_{size_name}.jpg"
+
+def remove_image_files(etag):
+    # Caller holds IMAGE_STORE["lock"]
+    for size_name in IMAGE_SIZES:
+        IMAGE_STORE["lru"].pop((etag, size_name), None)
+        image_path(etag, size_name).unlink(missing_ok=True)
+
+def disk_usage(size_name):
+    # (path, size, mtime) of every file stored for one rendition
+    usage = []
+    for path in IMAGE_DIR.glob(f"*_{size_name}.jpg"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        usage.append((path, stat.st_size, stat.st_mtime))
+    return usage
+
+def evict_card_images(keep_etag):
+    # Caller holds IMAGE_STORE["lock"]. Card files are rebuilt from the stored
+    # copy on demand, so only they are evicted; reads bump mtime for recency.
+    usage = disk_usage("card")
+    total = sum(size for _, size, _ in usage)
+    for path, size, _ in sorted(usage, key=lambda entry: entry[2]):
+        if total <= IMAGE_CARD_DISK_MAX_BYTES:
+            break
+        if path == image_path(keep_etag, "card"):
+            continue
+        IMAGE_STORE["lru"].pop((path.name.split("_", 1)[0], "card"), None)
+        path.unlink(missing_ok=True)
+        total -= size
+
+def render_image(source, etag, size_name):
+    from PIL import ImageOps
+    ImageOps.fit(source, IMAGE_SIZES[size_name]).save(image_path(etag, size_name), "JPEG", quality=85)
+
+def save_product_image(product_name, data):
+    from PIL import Image, ImageOps
+    etag = hashlib.sha1(data).hexdigest()[:16]
+    IMAGE_DIR.mkdir(exist_ok=True)
+
+    # Resize once at upload time; identical uploads share the same files
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        with IMAGE_STORE["lock"]:
+            if not image_path(etag, STORED_SIZE).exists():
+                stored = sum(size for _, size, _ in disk_usage(STORED_SIZE))
+                if stored >= IMAGE_STORE_MAX_BYTES:
+                    raise ImageQuotaError("Image storage is full; the product was saved without a new image.")
+            for size_name in IMAGE_SIZES:
+                if not image_path(etag, size_name).exists():
+                    render_image(img, etag, size_name)
+
+            old_etag = PRODUCT_IMAGES.get(product_name)
+            PRODUCT_IMAGES[product_name] = etag
+            if old_etag and old_etag != etag and old_etag not in PRODUCT_IMAGES.values():
+                remove_image_files(old_etag)
+            evict_card_images(keep_etag=etag)
+    return etag
+
+def drop_product_image(product_name):
+    with IMAGE_STORE["lock"]:
+        etag = PRODUCT_IMAGES.pop(product_name, None)
+        if etag and etag not in PRODUCT_IMAGES.values():
+            remove_image_files(etag)
+
+@st.cache_data
+def placeholder_image(size_name):
+    from PIL import Image, ImageDraw
+    width, height = IMAGE_SIZES[size_name]
+    img = Image.new("RGB", (width, height), "#F5EDE6")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, width - 1, height - 1], outline="#8B4513", width=3)
+    draw.text((width // 2, height // 2), "No image yet", fill="#8B4513", anchor="mm")
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+def load_product_image(product_name, size_name="detail"):
+    lru = IMAGE_STORE["lru"]
+    with IMAGE_STORE["lock"]:
+        etag = PRODUCT_IMAGES.get(product_name)
+        if etag is None:
+            return placeholder_image(size_name)
+        key = (etag, size_name)
+        if key in lru:
+            lru.move_to_end(key)
+            return lru[key]
+
+    path = image_path(etag, size_name)
+    try:
+        if size_name != STORED_SIZE and not path.exists():
+            from PIL import Image
+            with Image.open(image_path(etag, STORED_SIZE)) as img:
+                with IMAGE_STORE["lock"]:
+                    render_image(img, etag, size_name)
+                    evict_card_images(keep_etag=etag)
+        data = path.read_bytes()
+        os.utime(path)
+    except OSError:
+        return placeholder_image(size_name)
+
+    with IMAGE_STORE["lock"]:
+        lru[key] = data
+        while len(lru) > IMAGE_CACHE_MAX:
+            lru.popitem(last=False)
+    return data
+
+# ────────────────────────────────────────────────
+# PRODUCT IDENTITY (canonical IDs & duplicate merging)
+# ────────────────────────────────────────────────
+NAME_SYNONYMS = {"fridge": "refrigerator", "tv": "television", "ac": "air conditioner", "washer": "washing machine"}
+MERGE_CUTOFF = 0.8
+MERGE_SHORTLIST = 50
+
+def normalize_product_name(name):
+    text = unicodedata.normalize("NFKC", name).casefold()
+    text = re.sub(r"[\W_]+", " ", text)
+    return " ".join(NAME_SYNONYMS.get(word, word) for word in text.split())
+
+def key_to_product_id(key):
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+def product_id(name):
+    return key_to_product_id(normalize_product_name(name))
+
+@st.cache_resource
+def get_product_index():
+    # product ID -> catalog key of the canonical listing
+    ids = SNAPSHOT["product_ids"]
+    # product ID -> normalized name it was hashed from
+    keys = SNAPSHOT["product_keys"]
+    for name in GLOBAL_CATALOG:
+        ids.setdefault(product_id(name), name)
+    for pid, name in ids.items():
+        keys.setdefault(pid, normalize_product_name(name))
+    # word -> product IDs whose key contains it, to shortlist merge candidates
+    tokens = defaultdict(set)
+    for pid, key in keys.items():
+        for word in key.split():
+            tokens[word].add(pid)
+    return {"ids": ids, "keys": keys, "tokens": tokens, "merge_queue": SNAPSHOT["merge_queue"], "lock": threading.Lock()}
+
+PRODUCT_INDEX = get_product_index()
+PRODUCT_IDS = PRODUCT_INDEX["ids"]
+PRODUCT_KEYS = PRODUCT_INDEX["keys"]
+PRODUCT_TOKENS = PRODUCT_INDEX["tokens"]
+MERGE_QUEUE = PRODUCT_INDEX["merge_queue"]
+
+def queue_merge_candidate(candidate):
+    # Caller holds PRODUCT_INDEX["lock"]. One entry per pair of names, in
+    # either direction, however many IDs lead to them.
+    pair = {candidate["source"], candidate["target"]}
+    if len(pair) == 2 and not any({c["source"], c["target"]} == pair for c in MERGE_QUEUE):
+        MERGE_QUEUE.append(candidate)
+
+def resolve_product_name(raw_name):
+    name = " ".join(raw_name.split())
+    new_key = normalize_product_name(name)
+    pid = key_to_product_id(new_key)
+    with PRODUCT_INDEX["lock"]:
+        existing = PRODUCT_IDS.get(pid)
+        if existing is not None:
+            return existing
+        PRODUCT_IDS[pid] = name
+        PRODUCT_KEYS[pid] = new_key
+        words = set(new_key.split())
+        postings = [tuple(PRODUCT_TOKENS[word]) for word in words]
+        for word in words:
+            PRODUCT_TOKENS[word].add(pid)
+
+    # New product: queue near-identical names for a seller to confirm. Only
+    # the names sharing the most words (at least half) get the expensive
+    # comparison, and none of it runs under the index lock.
+    overlap = Counter(p for posting in postings for p in posting)
+    needed = (len(words) + 1) // 2
+    shortlist = [p for p, count in overlap.most_common(MERGE_SHORTLIST) if count >= needed]
+    by_key = {PRODUCT_KEYS.get(p): p for p in shortlist}
+    by_key.pop(None, None)
+    matches = difflib.get_close_matches(new_key, list(by_key), n=3, cutoff=MERGE_CUTOFF)
+    if matches:
+        with PRODUCT_INDEX["lock"]:
+            for key in matches:
+                target = PRODUCT_IDS.get(by_key[key])
+                if target is not None:
+                    score = difflib.SequenceMatcher(None, new_key, key).ratio()
+                    queue_merge_candidate({"source": name, "target": target, "score": score})
+    return name
+
+def upsert_offer(raw_name, offer):
+    name = resolve_product_name(raw_name)
+    offers = GLOBAL_CATALOG.setdefault(name, [])
+    for i, ex in enumerate(offers):
+        if ex.get("seller_username") == offer["seller_username"]:
+            offers[i] = offer
+            return name, True
+    offers.append(offer)
+    return name, False
+
+def drop_product(name):
+    with PRODUCT_INDEX["lock"]:
+        for offer in GLOBAL_CATALOG.pop(name, []):
+            record_deleted_offer(name, offer)
+        for pid in [pid for pid, n in PRODUCT_IDS.items() if n == name]:
+            del PRODUCT_IDS[pid]
+            for word in PRODUCT_KEYS.pop(pid, "").split():
+                PRODUCT_TOKENS[word].discard(pid)
+        MERGE_QUEUE[:] = [c for c in MERGE_QUEUE if name not in (c["source"], c["target"])]
+    drop_product_image(name)
+
+def move_seller_offer(source, target, username):
+    # Only the given seller's offer moves; other sellers' listings stay put
+    with PRODUCT_INDEX["lock"]:
+        source_offers = GLOBAL_CATALOG.get(source, [])
+        offer = next((o for o in source_offers if o.get("seller_username") == username), None)
+        if offer is None:
+            return False
+        source_offers.remove(offer)
+        record_deleted_offer(source, offer)
+
+        target_offers = GLOBAL_CATALOG.setdefault(target, [])
+        same_seller = next((o for o in target_offers if o.get("seller_username") == username), None)
+        if same_seller is None:
+            target_offers.append(offer)
+        else:
+            same_seller.setdefault("reviews", []).extend(offer.get("reviews", []))
+            same_seller.setdefault("price_reports", []).extend(offer.get("price_reports", []))
+            offer = same_seller
+        offer["updated_at"] = now_timestamp()
+
+        source_emptied = not source_offers
+        if source_emptied:
+            # Nothing left under the old name: it becomes an alias of the target.
+            # Its PRODUCT_KEYS and PRODUCT_TOKENS entries stay on purpose, so
+            # the old spelling still resolves to, and shortlists, the target.
+            del GLOBAL_CATALOG[source]
+            for pid, n in PRODUCT_IDS.items():
+                if n == source:
+                    PRODUCT_IDS[pid] = target
+            queued = list(MERGE_QUEUE)
+            MERGE_QUEUE.clear()
+            for c in queued:
+                queue_merge_candidate({**c, "source": target if c["source"] == source else c["source"],
+                                       "target": target if c["target"] == source else c["target"]})
+
+    if source_emptied:
+        with IMAGE_STORE["lock"]:
+            if source in PRODUCT_IMAGES and target not in PRODUCT_IMAGES:
+                PRODUCT_IMAGES[target] = PRODUCT_IMAGES.pop(source)
+        drop_product_image(source)
+    return True
+
+def dismiss_merge_candidate(candidate):
+    with PRODUCT_INDEX["lock"]:
+        if candidate in MERGE_QUEUE:
+            MERGE_QUEUE.remove(candidate)
+
+# ────────────────────────────────────────────────
+# SELLER DATA EXPORT (streamed in chunks, incremental)
+# ────────────────────────────────────────────────
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Reviews and price reports were stamped to the minute before exports existed
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+EXPORT_CHUNK_ROWS = 500
+EXPORT_DATASETS = {
+    "Offers": [("product_id", "str"), ("product", "str"), ("store", "str"), ("price", "float"),
+               ("sale_price", "float"), ("is_sale", "bool"), ("in_stock", "bool"), ("desc", "str"),
+               ("updated_at", "str"), ("deleted", "bool")],
+    "Reviews": [("product_id", "str"), ("product", "str"), ("store", "str"), ("user", "str"),
+                ("rating", "int"), ("text", "str"), ("timestamp", "str")],
+    "Price reports": [("product_id", "str"), ("product", "str"), ("store", "str"), ("user", "str"),
+                      ("price", "float"), ("timestamp", "str"), ("bill_filename", "str")]
+}
+
+# seller username -> {dataset: timestamp of the last export}
+EXPORT_LOG = SNAPSHOT["exports"]
+# Offers removed by Delete, a move or drop_product, until the seller's next
+# Offers export has reported them
+DELETED_OFFERS = SNAPSHOT["deleted_offers"]
+
+def now_timestamp():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+def record_deleted_offer(product_name, offer):
+    with SNAPSHOT["export_lock"]:
+        DELETED_OFFERS.append({
+            "seller_username": offer.get("seller_username"),
+            "product_id": product_id(product_name),
+            "product": product_name,
+            "store": offer.get("store"),
+            "deleted_at": now_timestamp()
+        })
+
+def changed_since(timestamp, since):
+    if since is None:
+        return True
+    if not timestamp:
+        # Untracked records predate exports, so the first full export covered them
+        return False
+    cutoff = datetime.strptime(since, TIMESTAMP_FORMAT)
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT) >= cutoff
+    except ValueError:
+        # A legacy minute stamp may hide seconds past the cutoff, so compare minutes
+        return datetime.strptime(timestamp, LEGACY_TIMESTAMP_FORMAT) >= cutoff.replace(second=0)
+
+def iter_seller_rows(username, dataset, since=None):
+    columns = [name for name, _ in EXPORT_DATASETS[dataset]]
+    # Copy only the (name, offers) pairs so other sessions can keep editing
+    for product_name, offers in list(GLOBAL_CATALOG.items()):
+        for offer in list(offers):
+            if offer.get("seller_username") != username:
+                continue
+            base = {"product_id": product_id(product_name), "product": product_name, "store": offer["store"],
+                    "deleted": False}
+            if dataset == "Offers":
+                records = [offer] if changed_since(offer.get("updated_at"), since) else []
+            else:
+                entries = offer.get("reviews" if dataset == "Reviews" else "price_reports", [])
+                records = [r for r in entries if changed_since(r.get("timestamp"), since)]
+            for record in records:
+                yield {col: base[col] if col in base else record.get(col) for col in columns}
+
+    if dataset == "Offers" and since is not None:
+        # A full export lists live offers only; an incremental one also
+        # reports the offers removed since the last export
+        for tombstone in list(DELETED_OFFERS):
+            if tombstone["seller_username"] == username and changed_since(tombstone["deleted_at"], since):
+                row = {col: tombstone.get(col) for col in columns}
+                row.update(updated_at=tombstone["deleted_at"], deleted=True)
+                yield row
+
+def iter_chunks(rows, size=EXPORT_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stream_csv(rows, dataset):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=[name for name, _ in EXPORT_DATASETS[dataset]])
+    writer.writeheader()
+    for chunk in iter_chunks(rows):
+        writer.writerows(chunk)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands out what was written since the last drain.
+    # tell() keeps counting so the Parquet footer offsets stay absolute.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def stream_parquet(rows, dataset):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"str": pa.string(), "float": pa.float64(), "int": pa.int64(), "bool": pa.bool_()}
+    schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_DATASETS[dataset]])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in iter_chunks(rows):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def export_seller_data(username, dataset, fmt, incremental):
+    started_at = now_timestamp()
+    since = EXPORT_LOG.get(username, {}).get(dataset) if incremental else None
+    rows = iter_seller_rows(username, dataset, since)
+    chunks = stream_parquet(rows, dataset) if fmt == "Parquet" else stream_csv(rows, dataset)
+
+    # Streamlit reads the whole download into memory anyway, so build the
+    # file as bytes; the chunking keeps the per-row objects short-lived
+    out = io.BytesIO()
+    for chunk in chunks:
+        out.write(chunk)
+    out.seek(0)
+
+    # Only a fully written export moves the watermark
+    with SNAPSHOT["export_lock"]:
+        EXPORT_LOG.setdefault(username, {})[dataset] = started_at
+        if dataset == "Offers":
+            DELETED_OFFERS[:] = [t for t in DELETED_OFFERS
+                                 if t["seller_username"] != username or t["deleted_at"] >= started_at]
+    schedule_catalog_snapshot()
+    return out
+
 def apply_theme():
     st.markdown("""
         <style>
@@ -144,8 +724,10 @@ def admin_page():
                 for offer in offers:
                     if offer.get("seller_username") == current_user:
                         offer["loc"] = (new_lat, new_lon)
+                        offer["updated_at"] = now_timestamp()
                         updated_count += 1
 
+            schedule_catalog_snapshot()
             st.success(f"Store location updated! Applied to {updated_count} offers.")
             st.rerun()
 
@@ -154,8 +736,11 @@ def admin_page():
         st.caption("Columns: name, desc, price, sale_price (optional)")
         uploaded = st.file_uploader("Choose CSV file", type="csv", key="csv_upload")
 
-        if uploaded:
+        # The uploader keeps its file across reruns; import each upload once
+        if uploaded and st.session_state.get("csv_imported_id") != uploaded.file_id:
+            st.session_state.csv_imported_id = uploaded.file_id
             try:
+                import pandas as pd
                 df = pd.read_csv(uploaded)
                 count = 0
                 for _, row in df.iterrows():
@@ -178,24 +763,15 @@ def admin_page():
                         "reviews": [],
                         "open_hours": store["open_hours"],
                         "open_days": store["open_days"],
-                        "in_stock": True
+                        "in_stock": True,
+                        "updated_at": now_timestamp()
                     }
 
-                    if name not in GLOBAL_CATALOG:
-                        GLOBAL_CATALOG[name] = []
-
-                    replaced = False
-                    for i, ex in enumerate(GLOBAL_CATALOG[name]):
-                        if ex.get("seller_username") == current_user:
-                            GLOBAL_CATALOG[name][i] = offer
-                            replaced = True
-                            break
-                    if not replaced:
-                        GLOBAL_CATALOG[name].append(offer)
-
+                    upsert_offer(name, offer)
                     count += 1
 
                 if count > 0:
+                    schedule_catalog_snapshot()
                     st.success(f"Processed {count} items")
                     st.rerun()
 
@@ -214,6 +790,7 @@ def admin_page():
         sale_price_input = c2.number_input("Sale price (optional)", min_value=0.0, step=100.0)
 
         description = st.text_area("Description", height=110)
+        image_file = st.file_uploader("Product image (optional)", type=["jpg", "jpeg", "png"])
 
         submitted = st.form_submit_button("Save Product", use_container_width=True)
 
@@ -234,26 +811,66 @@ def admin_page():
                 "reviews": [],
                 "open_hours": store["open_hours"],
                 "open_days": store["open_days"],
-                "in_stock": True
+                "in_stock": True,
+                "updated_at": now_timestamp()
             }
 
-            if name not in GLOBAL_CATALOG:
-                GLOBAL_CATALOG[name] = []
-
-            updated = False
-            for i, ex in enumerate(GLOBAL_CATALOG[name]):
-                if ex.get("seller_username") == current_user:
-                    GLOBAL_CATALOG[name][i] = offer
-                    updated = True
-                    break
-            if not updated:
-                GLOBAL_CATALOG[name].append(offer)
-
-            st.success(f"✓ Product **{raw_name}** saved / updated")
-            st.rerun()
+            name, _ = upsert_offer(name, offer)
+
+            image_ok = True
+            if image_file:
+                try:
+                    save_product_image(name, image_file.getvalue())
+                except ImageQuotaError as e:
+                    st.warning(str(e))
+                    image_ok = False
+                except Exception as e:
+                    st.error(f"Image processing error: {e}")
+                    image_ok = False
+
+            schedule_catalog_snapshot()
+            if name != " ".join(raw_name.split()):
+                st.success(f"✓ Saved under existing product **{name}**")
+            else:
+                st.success(f"✓ Product **{raw_name}** saved / updated")
+            if image_ok:
+                st.rerun()
         elif submitted:
             st.error("Product name is required")
 
+    # Possible duplicates involving this seller's listings
+    my_names = {n for n, offers in GLOBAL_CATALOG.items() if any(o.get("seller_username") == current_user for o in offers)}
+    candidates = [c for c in MERGE_QUEUE if c["source"] in my_names or c["target"] in my_names]
+    if candidates:
+        st.divider()
+        st.subheader("Possible Duplicate Listings")
+        st.caption("Moving transfers only your own offer, with its reviews and price reports. Other stores' listings are not touched.")
+        for idx, cand in enumerate(candidates):
+            # Move from the side this seller lists on towards the other name
+            src, dst = (cand["source"], cand["target"]) if cand["source"] in my_names else (cand["target"], cand["source"])
+            key_suffix = f"{idx}_{product_id(src)}_{product_id(dst)}"
+
+            cols = st.columns([4, 1, 1])
+            cols[0].markdown(f"**{src}** ↔ **{dst}**  ({cand['score']:.0%} similar)")
+            if cols[1].button("Move my listing", key=f"merge_{key_suffix}"):
+                st.session_state.confirm_merge = key_suffix
+            if cols[2].button("Keep separate", key=f"keep_{key_suffix}"):
+                dismiss_merge_candidate(cand)
+                schedule_catalog_snapshot()
+                st.rerun()
+
+            if st.session_state.get("confirm_merge") == key_suffix:
+                st.warning(f"Move your offer for **{src}** onto **{dst}**?")
+                c1, c2 = st.columns(2)
+                if c1.button("Confirm move", key=f"confirm_{key_suffix}"):
+                    del st.session_state.confirm_merge
+                    if move_seller_offer(src, dst, current_user):
+                        schedule_catalog_snapshot()
+                    st.rerun()
+                if c2.button("Cancel", key=f"cancel_{key_suffix}"):
+                    del st.session_state.confirm_merge
+                    st.rerun()
+
     # ───── My Added Products ───── (no refresh button)
     st.divider()
     st.subheader("My Added Products")
@@ -303,6 +920,8 @@ def admin_page():
                             else:
                                 offer["sale_price"] = None
                                 offer["is_sale"] = False
+                            offer["updated_at"] = now_timestamp()
+                            schedule_catalog_snapshot()
                             st.success(f"Price updated → ₹{new_regular:,}")
                             st.rerun()
 
@@ -311,17 +930,21 @@ def admin_page():
                 btn_text = "Mark Out of Stock" if current_stock else "Mark In Stock"
                 if st.button(btn_text, key=f"stock_{key_prefix}"):
                     offer["in_stock"] = not current_stock
+                    offer["updated_at"] = now_timestamp()
+                    schedule_catalog_snapshot()
                     st.success(f"**{name}** marked as {'In Stock' if offer['in_stock'] else 'Out of Stock'}")
                     st.rerun()
 
                 # Delete button
                 if st.button("🗑️ Delete", key=f"del_{key_prefix}", type="primary"):
+                    record_deleted_offer(name, offer)
                     GLOBAL_CATALOG[name] = [
                         ex for ex in GLOBAL_CATALOG[name]
                         if ex.get("seller_username") != current_user
                     ]
                     if not GLOBAL_CATALOG[name]:
-                        del GLOBAL_CATALOG[name]
+                        drop_product(name)
+                    schedule_catalog_snapshot()
                     st.success(f"Product **{name}** deleted.")
                     st.rerun()
 
@@ -354,6 +977,38 @@ def admin_page():
     if not has_content:
         st.info("No reviews or price reports yet on your products.")
 
+    # Export for POS reconciliation
+    st.divider()
+    st.subheader("Export My Data")
+
+    c1, c2 = st.columns(2)
+    dataset = c1.selectbox("Data", list(EXPORT_DATASETS), key="export_dataset")
+    fmt = c2.radio("Format", ["CSV", "Parquet"], horizontal=True, key="export_format")
+    last_export = EXPORT_LOG.get(current_user, {}).get(dataset)
+    # Keyed per dataset and watermark so the default follows each dataset's
+    # history instead of the first render's
+    incremental = st.checkbox(
+        f"Only changes since last export ({last_export})" if last_export else "Only changes since last export",
+        value=bool(last_export),
+        disabled=not last_export,
+        key=f"export_incremental_{dataset}_{bool(last_export)}"
+    )
+    incremental = incremental and bool(last_export)
+    if incremental and dataset != "Offers":
+        st.caption("Reviews and price reports of deleted or moved listings are not flagged here; "
+                   "use a full export to reconcile those.")
+
+    safe_store = re.sub(r"\W+", "_", store["store_name"]).strip("_").lower()
+    safe_dataset = dataset.lower().replace(" ", "_")
+    st.download_button(
+        f"⬇️ Download {dataset} ({fmt})",
+        data=lambda: export_seller_data(current_user, dataset, fmt, incremental),
+        file_name=f"{safe_store}_{safe_dataset}_{datetime.now():%Y%m%d_%H%M}.{fmt.lower()}",
+        mime="text/csv" if fmt == "CSV" else "application/vnd.apache.parquet",
+        on_click="ignore",
+        key="export_download"
+    )
+
 # ────────────────────────────────────────────────
 # USER — HOME / BROWSING PAGE
 # ────────────────────────────────────────────────
@@ -443,9 +1098,14 @@ def home_page():
 
     if sales_items:
         cols = st.columns(3)
+        shown_images = set()
         for i, (name, o) in enumerate(sales_items):
-            dist = geodesic(st.session_state.user_location, o["loc"]).km
+            dist = distance_km(st.session_state.user_location, o["loc"])
             with cols[i % 3]:
+                # One image per product, however many stores have it on sale
+                if name not in shown_images:
+                    shown_images.add(name)
+                    st.image(load_product_image(name, "card"), width="stretch")
                 stock_badge = '<span class="badge in-stock">In Stock</span>' if o.get("in_stock", True) else '<span class="badge out-of-stock">Out of Stock</span>'
                 st.markdown(f"""
                 <div class="deal-card">
@@ -468,6 +1128,9 @@ def home_page():
     if search_term:
         all_names = list(GLOBAL_CATALOG.keys())
         suggestions = difflib.get_close_matches(search_term, all_names, n=5, cutoff=0.5)
+        exact = PRODUCT_IDS.get(product_id(search_term))
+        if exact in GLOBAL_CATALOG:
+            suggestions = [exact] + [sug for sug in suggestions if sug != exact][:4]
         if suggestions:
             st.write("Did you mean:")
             cols = st.columns(min(5, len(suggestions)))
@@ -485,6 +1148,7 @@ def home_page():
 
         if offers:
             st.header(f"🛍️ {item_name}")
+            st.image(load_product_image(item_name), width="stretch")
 
             user_loc = st.session_state.user_location
             now = datetime.now()
@@ -501,7 +1165,7 @@ def home_page():
             for o in offers:
                 if not o.get("in_stock", True):
                     continue
-                dist = geodesic(user_loc, o["loc"]).km
+                dist = distance_km(user_loc, o["loc"])
                 reviews = o.get("reviews", [])
                 avg_rating = sum(r["rating"] for r in reviews) / len(reviews) if reviews else 0
                 price_val = o["sale_price"] if o.get("is_sale") else o["price"]
@@ -541,9 +1205,6 @@ def home_page():
                 stock_status = "In Stock ✅" if o.get("in_stock", True) else "Out of Stock ❌"
                 st.markdown(f"**Status:** {stock_status}")
 
-                img_url = f"https://loremflickr.com/320/180/appliance,{item_name.lower().replace(' ','_')}"
-                st.image(img_url, use_column_width=True)
-
                 maps_url = f"https://www.google.com/maps/dir/?api=1&origin={user_loc[0]},{user_loc[1]}&destination={o['loc'][0]},{o['loc'][1]}"
                 st.markdown(
                     f'<a href="{maps_url}" target="_blank" rel="noopener noreferrer">'
@@ -571,8 +1232,10 @@ def home_page():
                                 o["reviews"].append({
                                     "user": st.session_state.username,
                                     "rating": rating,
-                                    "text": comment
+                                    "text": comment,
+                                    "timestamp": now_timestamp()
                                 })
+                                schedule_catalog_snapshot()
                                 st.success("Review added! Thank you!")
                                 st.rerun()
 
@@ -587,7 +1250,7 @@ def home_page():
                                 report = {
                                     "user": st.session_state.username,
                                     "price": paid_price,
-                                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                                    "timestamp": now_timestamp(),
                                     "bill_filename": bill_file.name if bill_file else None
                                 }
                                 if "price_reports" not in o:
@@ -597,6 +1260,7 @@ def home_page():
                                 if bill_file:
                                     st.info(f"Bill '{bill_file.name}' received (verification pending)")
 
+                                schedule_catalog_snapshot()
                                 st.success("Price report submitted — thank you!")
                                 st.rerun()
                             else:
@@ -631,7 +1295,7 @@ def home_page():
                     continue
                 prices = [o["sale_price"] if o.get("is_sale") else o["price"] for o in in_stock_offers]
                 min_p = min(prices) if prices else 0
-                min_d = min(geodesic(st.session_state.user_location, o["loc"]).km for o in in_stock_offers)
+                min_d = min(distance_km(st.session_state.user_location, o["loc"]) for o in in_stock_offers)
 
                 with cols[i % 3]:
                     st.markdown(f"""
@@ -735,6 +1399,9 @@ init_data()
 
 if not st.session_state.authenticated:
     auth_page()
+    if STARTUP_METRICS["first_paint_s"] is None:
+        STARTUP_METRICS["first_paint_s"] = time.time() - STARTUP_METRICS["started_at"]
+        log.info("auth_page first paint %.1f ms after process start", STARTUP_METRICS["first_paint_s"] * 1000)
 else:
     with st.sidebar:
         st.markdown(f"**Welcome, {st.session_state.username}** 👋")
@@ -755,3 +1422,8 @@ else:
         admin_page()
     else:
         home_page()
+
+if STARTUP_METRICS["ready_s"] is None:
+    STARTUP_METRICS["ready_s"] = time.time() - STARTUP_METRICS["started_at"]
+    log.info("Ready %.1f ms after process start (snapshot load %.1f ms)",
+             STARTUP_METRICS["ready_s"] * 1000, STARTUP_METRICS["snapshot_load_s"] * 1000)
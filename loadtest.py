@@ -0,0 +1,385 @@
+"""Concurrent-session load test for hack_her.py.
+
+Drives N simulated shoppers and sellers through Streamlit's AppTest in a
+thread pool against a seeded catalog snapshot, then reports rerun latency
+percentiles, throughput and RSS growth. Exits nonzero when an SLO is missed.
+
+    python loadtest.py --sessions 16 --iterations 25 --slo-p95-ms 1500
+"""
+import argparse
+import ast
+import json
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+APP_PATH = Path(__file__).parent / "hack_her.py"
+
+# share_app_test_runtime() patches AppTest internals; this is the release it
+# was written against (and the one requirements-dev.txt pins)
+TESTED_STREAMLIT = "1.66.0"
+
+BRANDS = ["Samsung", "LG", "Whirlpool", "Godrej", "Bosch", "Panasonic", "Haier", "IFB"]
+APPLIANCES = ["Double Door Refrigerator", "Front Load Washing Machine", "Split AC 1.5 Ton",
+              "Microwave Oven", "Smart LED TV 43 inch", "Water Purifier", "Dishwasher", "Air Fryer"]
+
+SELLERS = {
+    "seller1": {
+        "password": "pass1",
+        "store_name": "Appliance World",
+        "loc": (9.95, 76.29),
+        "open_hours": (9, 21),
+        "open_days": ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday"],
+        "address": "123 Kochi St, Kerala"
+    },
+    "seller2": {
+        "password": "pass2",
+        "store_name": "Home Mart",
+        "loc": (9.93, 76.27),
+        "open_hours": (10, 22),
+        "open_days": ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"],
+        "address": "456 Ernakulam Rd, Kerala"
+    }
+}
+
+USER_OPS = {"browse": 4, "search": 3, "detail": 3, "review": 1}
+SELLER_OPS = {"inventory": 2, "csv_upload": 1}
+
+# Exception types another session's GLOBAL_CATALOG edit can cause mid-loop
+MUTATION_ERROR_TYPES = {"RuntimeError", "IndexError", "KeyError", "ValueError"}
+CATALOG_NAMES = ("GLOBAL_CATALOG", "offers")
+
+def product_names(count):
+    names = [f"{brand} {item}" for brand in BRANDS for item in APPLIANCES]
+    return [names[i % len(names)] + (f" Gen {i // len(names) + 1}" if i >= len(names) else "") for i in range(count)]
+
+def app_constant(name):
+    # Read from the app source; importing hack_her.py would run the whole script
+    for node in ast.parse(APP_PATH.read_text()).body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    sys.exit(f"{APP_PATH.name} no longer defines {name}; update loadtest.py.")
+
+def seed_snapshot(path, products, rng):
+    catalog = {}
+    for name in product_names(products):
+        offers = []
+        for username in rng.sample(sorted(SELLERS), rng.randint(1, len(SELLERS))):
+            store = SELLERS[username]
+            price = float(rng.randrange(5000, 80000, 500))
+            sale_price = price - rng.randrange(500, 5000, 500) if rng.random() < 0.2 else None
+            offers.append({
+                "seller_username": username,
+                "store": store["store_name"],
+                "address": store["address"],
+                "loc": store["loc"],
+                "price": price,
+                "sale_price": sale_price,
+                "is_sale": sale_price is not None,
+                "desc": f"{name} with standard warranty",
+                "reviews": [],
+                "open_hours": store["open_hours"],
+                "open_days": store["open_days"],
+                "in_stock": rng.random() < 0.9
+            })
+        catalog[name] = offers
+    with open(path, "wb") as f:
+        pickle.dump({"version": app_constant("SNAPSHOT_VERSION"), "catalog": catalog}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    return list(catalog)
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def is_catalog_mutation_error(exc):
+    # A mutation error is one of the types above raised in an app frame that
+    # iterates or indexes the catalog, judged by the innermost app frame
+    if exc.proto.type not in MUTATION_ERROR_TYPES:
+        return False
+    if exc.proto.type == "RuntimeError" and "during iteration" not in exc.message:
+        return False
+    app_frames = [frame for frame in exc.stack_trace if APP_PATH.name in frame]
+    return bool(app_frames) and any(name in app_frames[-1] for name in CATALOG_NAMES)
+
+def flush_app_snapshot():
+    # The app debounces snapshot writes on a named timer; write a pending one
+    # now, while the work directory still exists, instead of at exit
+    timer_name = app_constant("SNAPSHOT_TIMER_NAME")
+    for thread in threading.enumerate():
+        if thread.name == timer_name and isinstance(thread, threading.Timer):
+            thread.function()
+
+def share_app_test_runtime():
+    # AppTest installs a process-global mock Runtime (and the global.appTest
+    # config flag) around every run and clears it afterwards, which breaks
+    # sessions still running in other threads. Keep the first one alive, and
+    # share one ScriptCache like the real server so the app is compiled once.
+    import streamlit
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    missing = [
+        name for obj, name in [(Runtime, "_instance"), (Runtime, "instance"), (Runtime, "exists"),
+                               (app_test, "ScriptCache"), (local_script_runner, "ScriptCache")]
+        if not hasattr(obj, name)
+    ]
+    if missing:
+        sys.exit(f"loadtest.py patches Streamlit internals that streamlit {streamlit.__version__} lacks "
+                 f"({', '.join(missing)}); pip install -r requirements-dev.txt.")
+    if streamlit.__version__ != TESTED_STREAMLIT:
+        print(f"warning: written against streamlit {TESTED_STREAMLIT}, running {streamlit.__version__}",
+              file=sys.stderr)
+
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    config.set_option("global.appTest", True)
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    shared = []
+
+    def instance(cls):
+        if not shared and cls._instance is not None:
+            shared.append(cls._instance)
+        if not shared:
+            raise RuntimeError("Runtime hasn't been created!")
+        return shared[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: bool(shared) or cls._instance is not None)
+
+class Session:
+    def __init__(self, session_id, role, names, args, rng, results):
+        from streamlit.testing.v1 import AppTest
+
+        self.id = session_id
+        self.role = role
+        self.names = names
+        self.rng = rng
+        self.results = results
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=args.timeout)
+        self.username = rng.choice(sorted(SELLERS)) if role == "Seller" else f"shopper{session_id}"
+        self.at.session_state["authenticated"] = True
+        self.at.session_state["username"] = self.username
+        self.at.session_state["role"] = role
+        if role == "Seller":
+            self.at.session_state["store_info"] = dict(SELLERS[self.username])
+
+    def timed(self, op, action):
+        started = time.perf_counter()
+        errors = []
+        try:
+            action()
+            errors = [(f"{e.proto.type}: {e.message}", is_catalog_mutation_error(e)) for e in self.at.exception]
+        except Exception as e:
+            errors = [(f"{type(e).__name__}: {e}", False)]
+        self.results.record(op, (time.perf_counter() - started) * 1000, errors)
+
+    def widget(self, elements, label):
+        return next(w for w in elements if w.label.startswith(label))
+
+    def browse(self):
+        if "selected_item" in self.at.session_state:
+            del self.at.session_state["selected_item"]
+        self.at.run()
+
+    def search(self):
+        term = self.rng.choice(self.names).split()[-2]
+        self.widget(self.at.text_input, "🔍").input(term).run()
+
+    def detail(self):
+        self.at.session_state["selected_item"] = self.rng.choice(self.names)
+        self.at.run()
+
+    def review(self):
+        self.detail()
+        forms = [b for b in self.at.button if b.label == "Submit Review"]
+        if forms:
+            self.widget(self.at.text_area, "Your comment").input("Load test review")
+            forms[0].click().run()
+
+    def inventory(self):
+        self.widget(self.at.sidebar.radio, "Dashboard").set_value("Manage Inventory").run()
+
+    def csv_upload(self):
+        self.inventory()
+        rows = ["name,desc,price,sale_price"]
+        for name in self.rng.sample(self.names, min(10, len(self.names))):
+            # Mix exact, re-cased and re-spaced names to exercise identity resolution
+            variant = self.rng.choice([name, name.lower(), name.replace(" ", "  ") + " "])
+            price = self.rng.randrange(5000, 80000, 500)
+            rows.append(f"{variant},Restocked,{price},{price - 500}")
+        data = "\n".join(rows).encode()
+        self.widget(self.at.file_uploader, "Choose CSV").set_value((f"inv_{self.id}.csv", data, "text/csv")).run()
+
+    def run(self, iterations):
+        self.timed("login", self.at.run)
+        ops = USER_OPS if self.role == "User" else SELLER_OPS
+        for _ in range(iterations):
+            op = self.rng.choices(list(ops), weights=list(ops.values()))[0]
+            self.timed(op, getattr(self, op))
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(list)
+
+    def record(self, op, latency_ms, errors):
+        # errors: list of (message, is_catalog_mutation) raised by this rerun
+        with self.lock:
+            self.latencies[op].append(latency_ms)
+            if errors:
+                self.errors[op].append(errors)
+
+def run_load_test(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="lowkey_loadtest_")
+    snapshot_path = os.path.join(workdir, "catalog_snapshot.pkl")
+    names = seed_snapshot(snapshot_path, args.products, rng)
+    os.environ["LOWKEY_SNAPSHOT"] = snapshot_path
+    share_app_test_runtime()
+
+    # Warm imports (including the app's lazy ones) and the shared catalog so
+    # RSS growth reflects sessions only
+    import geopy.distance, pandas  # noqa: F401
+    warmup = Results()
+    Session(-1, "User", names, args, random.Random(args.seed), warmup).run(0)
+    rss_start = rss_mb()
+
+    results = Results()
+    roles = ["Seller" if i < round(args.sessions * args.seller_ratio) else "User" for i in range(args.sessions)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [
+            pool.submit(lambda i=i, role=role: Session(i, role, names, args, random.Random(args.seed + i), results).run(args.iterations))
+            for i, role in enumerate(roles)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    rss_end = rss_mb()
+    flush_app_snapshot()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    all_latencies = sorted(ms for values in results.latencies.values() for ms in values)
+    failed_reruns = sum(len(values) for values in results.errors.values())
+    all_errors = [e for values in results.errors.values() for errors in values for e in errors]
+    report = {
+        "sessions": args.sessions,
+        "iterations": args.iterations,
+        "products": args.products,
+        "reruns": len(all_latencies),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(all_latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(all_latencies, 50),
+        "p95_ms": percentile(all_latencies, 95),
+        "p99_ms": percentile(all_latencies, 99),
+        "rss_start_mb": rss_start,
+        "rss_end_mb": rss_end,
+        "rss_growth_mb": rss_end - rss_start,
+        "error_rate": failed_reruns / len(all_latencies) if all_latencies else 0.0,
+        "mutation_errors": [message for message, is_mutation in all_errors if is_mutation],
+        "other_errors": [message for message, is_mutation in all_errors if not is_mutation],
+        "ops": {
+            op: {
+                "count": len(values),
+                "p50_ms": percentile(sorted(values), 50),
+                "p95_ms": percentile(sorted(values), 95),
+                "p99_ms": percentile(sorted(values), 99),
+                "errors": len(results.errors[op])
+            }
+            for op, values in sorted(results.latencies.items())
+        }
+    }
+    return report
+
+def check_slos(report, args):
+    violations = []
+    if report["p95_ms"] > args.slo_p95_ms:
+        violations.append(f"p95 {report['p95_ms']:.0f} ms > {args.slo_p95_ms:.0f} ms")
+    if report["p99_ms"] > args.slo_p99_ms:
+        violations.append(f"p99 {report['p99_ms']:.0f} ms > {args.slo_p99_ms:.0f} ms")
+    if report["rss_growth_mb"] > args.slo_rss_growth_mb:
+        violations.append(f"RSS growth {report['rss_growth_mb']:.1f} MB > {args.slo_rss_growth_mb:.1f} MB")
+    if report["error_rate"] > args.slo_error_rate:
+        violations.append(f"error rate {report['error_rate']:.2%} > {args.slo_error_rate:.2%}")
+    if len(report["mutation_errors"]) > args.slo_mutation_errors:
+        violations.append(f"{len(report['mutation_errors'])} concurrent GLOBAL_CATALOG mutation errors > {args.slo_mutation_errors}")
+    if report["throughput_rps"] < args.slo_min_throughput:
+        violations.append(f"throughput {report['throughput_rps']:.1f} reruns/s < {args.slo_min_throughput:.1f}")
+    return violations
+
+def print_report(report, violations):
+    print(f"Sessions: {report['sessions']} x {report['iterations']} iterations over {report['products']} products")
+    print(f"Reruns: {report['reruns']} in {report['elapsed_s']:.1f}s  ({report['throughput_rps']:.1f} reruns/s)")
+    print(f"Latency: p50 {report['p50_ms']:.0f} ms  p95 {report['p95_ms']:.0f} ms  p99 {report['p99_ms']:.0f} ms")
+    print(f"RSS: {report['rss_start_mb']:.1f} MB -> {report['rss_end_mb']:.1f} MB  (+{report['rss_growth_mb']:.1f} MB)")
+    print()
+    print(f"{'op':<12}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for op, stats in report["ops"].items():
+        print(f"{op:<12}{stats['count']:>7}{stats['p50_ms']:>9.0f}{stats['p95_ms']:>9.0f}{stats['p99_ms']:>9.0f}{stats['errors']:>8}")
+
+    if report["mutation_errors"]:
+        print(f"\n⚠️  {len(report['mutation_errors'])} errors from concurrent GLOBAL_CATALOG mutation, e.g.:")
+        for error in sorted(set(report["mutation_errors"]))[:5]:
+            print(f"  - {error}")
+    if report["other_errors"]:
+        print(f"\n{len(report['other_errors'])} other errors, e.g.:")
+        for error in sorted(set(report["other_errors"]))[:5]:
+            print(f"  - {error}")
+
+    print()
+    if violations:
+        print("SLO FAILED:")
+        for v in violations:
+            print(f"  - {v}")
+    else:
+        print("All SLOs met.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for LowKey Deals")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated sessions")
+    parser.add_argument("--iterations", type=int, default=20, help="actions per session")
+    parser.add_argument("--products", type=int, default=200, help="products in the seeded catalog")
+    parser.add_argument("--seller-ratio", type=float, default=0.25, help="share of sessions that are sellers")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=30, help="per-rerun timeout in seconds")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    parser.add_argument("--slo-p95-ms", type=float, default=1500)
+    parser.add_argument("--slo-p99-ms", type=float, default=3000)
+    parser.add_argument("--slo-rss-growth-mb", type=float, default=256)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-mutation-errors", type=int, default=0)
+    parser.add_argument("--slo-min-throughput", type=float, default=0, help="minimum reruns/s")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args)
+    violations = check_slos(report, args)
+    print_report(report, violations)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({**report, "slo_violations": violations}, f, indent=2)
+    return 1 if violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
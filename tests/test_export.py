@@ -0,0 +1,137 @@
+import io
+import runpy
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+import streamlit as st
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = Path(__file__).parent.parent / "hack_her.py"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOWKEY_SNAPSHOT", str(tmp_path / "catalog_snapshot.pkl"))
+    st.cache_resource.clear()
+    app = runpy.run_path(str(APP_PATH))
+    # run_path returns a copy; the functions see the live module globals
+    app = app["export_seller_data"].__globals__
+    yield app
+    timer = app["SNAPSHOT"]["timer"]
+    if timer is not None:
+        timer.cancel()
+    st.cache_resource.clear()
+
+
+def add_offer(app, name, seller, **fields):
+    offer = {
+        "store": f"{seller} store",
+        "seller_username": seller,
+        "price": 1000.0,
+        "sale_price": None,
+        "is_sale": False,
+        "in_stock": True,
+        "desc": "",
+        "updated_at": app["now_timestamp"](),
+        "reviews": [],
+        "price_reports": [],
+        **fields
+    }
+    return app["upsert_offer"](name, offer)[0], offer
+
+
+def download_bytes(data):
+    # What st.download_button does with the callable's return value
+    return convert_data_to_bytes_and_infer_mime(data, unsupported_error=TypeError("unsupported"))[0]
+
+
+@pytest.mark.parametrize("dataset", ["Offers", "Reviews", "Price reports"])
+@pytest.mark.parametrize("fmt", ["CSV", "Parquet"])
+def test_export_is_a_valid_download(app, dataset, fmt):
+    _, offer = add_offer(app, "Blue Kettle", "seller1")
+    offer["reviews"].append({"user": "u", "rating": 4, "text": "ok", "timestamp": app["now_timestamp"]()})
+    offer["price_reports"].append({"user": "u", "price": 900.0, "timestamp": app["now_timestamp"](),
+                                   "bill_filename": None})
+
+    data = download_bytes(app["export_seller_data"]("seller1", dataset, fmt, False))
+
+    columns = [name for name, _ in app["EXPORT_DATASETS"][dataset]]
+    if fmt == "CSV":
+        lines = data.decode().splitlines()
+        assert lines[0].split(",") == columns
+        assert len(lines) == 2
+    else:
+        table = pq.read_table(io.BytesIO(data))
+        assert table.column_names == columns
+        assert table.num_rows == 1
+    assert app["EXPORT_LOG"]["seller1"][dataset]
+
+
+def test_failed_export_keeps_watermark(app, monkeypatch):
+    add_offer(app, "Blue Kettle", "seller1")
+    app["EXPORT_LOG"]["seller1"] = {"Offers": "2020-01-01 00:00:00"}
+
+    def broken_rows(*args, **kwargs):
+        yield from ()
+        raise OSError("disk full")
+
+    monkeypatch.setitem(app, "iter_seller_rows", broken_rows)
+    with pytest.raises(OSError):
+        app["export_seller_data"]("seller1", "Offers", "CSV", True)
+    assert app["EXPORT_LOG"]["seller1"]["Offers"] == "2020-01-01 00:00:00"
+
+
+def test_incremental_offers_report_deletions_and_moves(app):
+    kettle, _ = add_offer(app, "Blue Kettle", "seller1", updated_at="2020-01-01 00:00:00")
+    toaster, _ = add_offer(app, "Red Toaster", "seller1", updated_at="2020-01-01 00:00:00")
+    target, _ = add_offer(app, "Red Toaster Deluxe", "seller2", updated_at="2020-01-01 00:00:00")
+    app["EXPORT_LOG"]["seller1"] = {"Offers": "2021-01-01 00:00:00"}
+
+    app["drop_product"](kettle)
+    assert app["move_seller_offer"](toaster, target, "seller1")
+    # Deletions in the export's own second are kept for the next one, so backdate
+    for tombstone in app["DELETED_OFFERS"]:
+        tombstone["deleted_at"] = "2022-01-01 00:00:00"
+
+    data = download_bytes(app["export_seller_data"]("seller1", "Offers", "CSV", True)).decode()
+    rows = {(line.split(",")[1], line.split(",")[-1]) for line in data.splitlines()[1:]}
+    assert rows == {(kettle, "True"), (toaster, "True"), (target, "False")}
+
+    # Reported tombstones are not repeated by the next export
+    data = download_bytes(app["export_seller_data"]("seller1", "Offers", "CSV", True)).decode()
+    assert app["DELETED_OFFERS"] == []
+    assert all(line.split(",")[-1] == "False" for line in data.splitlines()[1:])
+
+
+def test_changed_since_handles_legacy_minute_timestamps(app):
+    changed_since = app["changed_since"]
+    assert changed_since("2024-05-01 10:30", "2024-05-01 10:30:45")
+    assert not changed_since("2024-05-01 10:29", "2024-05-01 10:30:45")
+    assert changed_since("2024-05-01 10:30:45", "2024-05-01 10:30:45")
+    assert not changed_since("2024-05-01 10:30:44", "2024-05-01 10:30:45")
+
+
+def test_incremental_checkbox_follows_each_datasets_watermark(app):
+    # Let the app write the snapshot the AppTest run starts from
+    app["EXPORT_LOG"]["seller1"] = {"Offers": "2024-05-01 10:30:45"}
+    assert app["save_catalog_snapshot"]()
+    st.cache_resource.clear()
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=30)
+    at.session_state["authenticated"] = True
+    at.session_state["username"] = "seller1"
+    at.session_state["role"] = "Seller"
+    at.session_state["store_info"] = {"store_name": "Appliance World", "loc": (9.95, 76.29), "open_hours": (9, 21),
+                                      "open_days": ["Monday"], "address": "123 Kochi St, Kerala"}
+    at.run()
+    next(r for r in at.radio if r.label == "Dashboard").set_value("Manage Inventory").run()
+
+    def incremental_box():
+        return next(c for c in at.checkbox if c.key.startswith("export_incremental"))
+
+    assert incremental_box().value and not incremental_box().disabled
+    at.selectbox(key="export_dataset").set_value("Reviews").run()
+    assert not incremental_box().value and incremental_box().disabled
+    assert not [c for c in at.caption if "full export" in c.value]